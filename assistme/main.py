@@ -2,11 +2,14 @@
 import os
 import sys
 import subprocess
+import threading
 import argparse
 import shutil
-import yaml  # pip install pyyaml
 import re
 import json
+import copy
+import io
+import wave
 
 # Определение путей
 HOME_DIR = os.path.expanduser("~")
@@ -15,19 +18,73 @@ ASME_WORK_DIR = os.path.join(ASME_DIR, "session")
 ASME_CONFIG_FILE = os.path.join(ASME_DIR, "config.yaml")
 ASME_LOG_FILE = os.path.join(ASME_DIR, "log.txt")
 ASME_WHISPER_DIR = os.path.join(ASME_DIR, "whisper.cpp")
+ASME_WHISPER_MODELS_DIR = os.path.join(ASME_WHISPER_DIR, "models")
+ASME_WHISPER_BIN_DIR = os.path.join(ASME_WHISPER_DIR, "build", "bin")
 
-# Файлы записи и конвертации в поддиректории WORK_DIR
-ASME_RECORD_FILE = os.path.join(ASME_WORK_DIR, "record.mp3")
-ASME_OUTPUT_FILE = os.path.join(ASME_WORK_DIR, "output.wav")
+# Файлы записи и результата транскрибации (без расширения .txt) в поддиректории WORK_DIR
+# и в директории сессии, в которую она переименовывается
+RECORD_FILE_NAME = "record.wav"
+OUTPUT_FILE_NAME = "output"
+ASME_RECORD_FILE = os.path.join(ASME_WORK_DIR, RECORD_FILE_NAME)
+ASME_OUTPUT_FILE = os.path.join(ASME_WORK_DIR, OUTPUT_FILE_NAME)
+
+# Формат аудио, который ожидает whisper.cpp: в нем же сохраняется запись
+WHISPER_SAMPLE_RATE = 16000
+# Сведение в моно с ресемплингом; rematrix_maxval=1 сохраняет громкость сведения такой же,
+# как при выводе сразу в s16
+DOWNMIX_FILTER_ARGS = f"osr={WHISPER_SAMPLE_RATE}:ochl=mono:osf=fltp:rematrix_maxval=1"
+
+# Автоматический выбор -p: whisper-cli делит запись на равные части и распознает их параллельно.
+# Части короче минуты и процессоры меньше чем с 4 потоками больше теряют в качестве и на накладных
+# расходах, чем выигрывают в скорости
+PARALLEL_MIN_CHUNK_SECONDS = 60
+PARALLEL_MIN_THREADS = 4
+
+# Параметры фильтра silenceremove: паузы тише -40 dB длиннее 0.5 с вырезаются, 0.25 с тишины
+# остается, чтобы whisper не склеивал слова по разные стороны паузы
+SILENCE_FILTER_ARGS = "stop_periods=-1:stop_duration=0.5:stop_threshold=-40dB:stop_silence=0.25"
+
+# Размер буфера для обмена данными с подпроцессами (и емкость канала там, где ее можно задать)
+PIPE_BUFFER_SIZE = 1 << 20
+
+# Допустимое название сессии: латинские буквы, цифры, _ и -
+SESSION_NAME_RE = re.compile(r'\A[A-Za-z0-9_-]+\Z')
+
+# Допустимое название модели whisper.cpp, например large-v3-turbo или distil-large-v3
+MODEL_NAME_RE = re.compile(r'\A[a-z0-9][a-z0-9.-]*\Z')
+
+# Допустимый код языка распознавания (whisper.language), например ru или en
+LANGUAGE_RE = re.compile(r'\A[a-z]+\Z')
+
+# Источник ggml-моделей, тот же, что использует models/download-ggml-model.sh
+WHISPER_MODELS_URL = "https://huggingface.co/ggerganov/whisper.cpp/resolve/main"
+
+# Таймаут (в секундах) на подключение и на каждое чтение при загрузке модели
+DOWNLOAD_TIMEOUT = 60
+
+# Варианты квантизации модели whisper.cpp (f16 – без квантизации). Готовые файлы есть
+# не для всех моделей, недостающие получаются из f16 утилитой quantize
+WHISPER_QUANTS = ["f16", "q8_0", "q5_1", "q5_0", "q5_k", "q4_1", "q4_0", "q4_k"]
 
 # Значения по умолчанию для аудио-устройств и языка
 DEFAULT_CONFIG = {
     "lang": "en",           # язык по умолчанию
     "keep_source": "true",  # сохранять исходник
     "stream_mode": "true",   # команда record будет выполнять транскрибацию сразу после завершения записи
+    "model": "large-v3-turbo",  # модель whisper.cpp
+    "quant": "q5_0",        # квантизация модели whisper
     "audio": {
         "input":  ":0",     # микрофон
-        "output": ":3"      # системный звук
+        "output": ":3",     # системный звук
+        "skip_silence": True  # вырезать паузы перед транскрибацией
+    },
+    "whisper": {
+        "language": "ru",          # язык распознавания
+        "threads": "auto",         # число потоков (-t), auto – по числу физических ядер
+        "processors": "auto",      # число процессоров (-p), auto – по длительности записи
+        "beam": 1,                 # размер beam search (-bs), 1 – жадное декодирование
+        "best_of": 1,              # число кандидатов при сэмплировании (-bo)
+        "flash_attention": True    # flash attention (-fa)
     }
 }
 
@@ -38,252 +95,863 @@ TRANSLATIONS_FILE = os.path.join(SCRIPT_DIR, "translations.json")
 # Глобальная переменная для файла конфигурации (можно переопределить через флаг)
 CURRENT_CONFIG_FILE = ASME_CONFIG_FILE
 
-# Создаем необходимые директории до настройки логирования
+# Директория для конфигурации; рабочая директория создается командами, которым она нужна
 os.makedirs(ASME_DIR, exist_ok=True)
-os.makedirs(ASME_WORK_DIR, exist_ok=True)
-if not os.path.exists(ASME_LOG_FILE):
-    open(ASME_LOG_FILE, 'a').close()
 
-# Настройка логирования: вывод в файл и консоль
+# Настройка логирования: вывод в файл и консоль.
+# delay=True: файл журнала открывается (и создается) только при первой записи в него.
+# Сообщения форматируются лениво ("{}" и аргументы), а приемники остаются синхронными: enqueue=True
+# тянет за собой multiprocessing и поток-обработчик, что дороже для запуска CLI, чем сама запись строк
 from loguru import logger
 logger.remove()
-logger.add(ASME_LOG_FILE, format="{time} - {level} - {message}", level="INFO", retention="1 day", mode="a")
-logger.add(sys.stdout, format="{message}", level="INFO")
+logger.add(ASME_LOG_FILE, format="{time} - {level} - {message}", level="INFO", retention="1 day", mode="a", delay=True)
+CONSOLE_HANDLER_ID = logger.add(sys.stdout, format="{message}", level="INFO")
+
+def enable_verbose_logging():
+    """Включает вывод отладочных сообщений (выполняемые команды) в консоль."""
+    global CONSOLE_HANDLER_ID
+    logger.remove(CONSOLE_HANDLER_ID)
+    CONSOLE_HANDLER_ID = logger.add(sys.stdout, format="{message}", level="DEBUG")
 
-# Глобальные переменные для i18n
+# Глобальные переменные для i18n: TRANSLATIONS содержит переводы только для CURRENT_LANG
 CURRENT_LANG = "en"
 TRANSLATIONS = {}
 
+# Кэш разобранных файлов: путь -> ((st_mtime_ns, st_size), содержимое)
+FILE_CACHE = {}
+
+def load_cached(path, loader):
+    """Разбирает файл функцией loader, повторно используя результат, пока у файла
+    не изменились время модификации и размер."""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = FILE_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        data = loader(f)
+    FILE_CACHE[path] = (key, data)
+    return data
+
 def load_translations(file_path):
     """Загружает переводы из JSON-файла."""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return load_cached(file_path, json.load)
     except Exception as e:
-        logger.error(f"Error loading translations: {e}")
+        logger.error("Error loading translations: {}", e)
         return {}
 
 def get_text(key):
     """Возвращает перевод для заданного ключа с учетом текущего языка."""
-    return TRANSLATIONS.get(CURRENT_LANG, {}).get(key, key)
-
-def run_command(cmd, cwd=None):
-    """Выполняет системную команду с логированием и проверкой ошибок."""
-    logger.debug(f"Executing: {cmd}")
-    result = subprocess.run(cmd, shell=True, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if result.returncode != 0:
-        logger.error(f"Error executing command: {cmd}")
-        logger.error(f"stdout:\n{result.stdout}")
-        logger.error(f"stderr:\n{result.stderr}")
-        return False, result.stdout + result.stderr
-    logger.debug(f"Command executed successfully: {cmd}")
-    return True, result.stdout
+    return TRANSLATIONS.get(key, key)
+
+# Найденные в PATH программы: имя -> абсолютный путь
+BINARY_PATHS = {}
+
+def binary_path(name):
+    """Возвращает абсолютный путь до программы, выполняя поиск в PATH один раз за процесс.
+    Ненайденные программы не кэшируются: они могут появиться, например, после brew install."""
+    path = BINARY_PATHS.get(name)
+    if path is None:
+        path = shutil.which(name)
+        if path is not None:
+            BINARY_PATHS[name] = path
+    return path
+
+def whisper_binary_path(*names):
+    """Возвращает путь до собранной программы whisper.cpp – первой из names, найденной в build/bin.
+    Найденный путь кэшируется вместе с путями из PATH, поэтому run_command его повторно не проверяет;
+    отсутствие не кэшируется, так как программа появляется после сборки."""
+    for name in names:
+        path = os.path.join(ASME_WHISPER_BIN_DIR, name)
+        if path in BINARY_PATHS or os.path.isfile(path):
+            BINARY_PATHS[path] = path
+            return path
+    return None
+
+def whisper_cli_path():
+    """Путь до whisper-cli или None, если whisper.cpp еще не собран."""
+    return whisper_binary_path("whisper-cli")
+
+def enlarge_pipe(fd):
+    """Увеличивает емкость канала до PIPE_BUFFER_SIZE, чтобы аудио передавалось крупными блоками.
+    Доступно только в Linux (F_SETPIPE_SZ); на других платформах емкость канала фиксирована."""
+    import fcntl
+    if not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, PIPE_BUFFER_SIZE)
+    except OSError:
+        # Размер выше /proc/sys/fs/pipe-max-size требует прав, остается емкость по умолчанию
+        pass
+
+def write_input(stream, data):
+    """Передает данные в stdin процесса и закрывает его. Выполняется в отдельном потоке,
+    чтобы процесс мог писать вывод, пока еще читает ввод."""
+    try:
+        stream.write(data)
+        stream.close()
+    except BrokenPipeError:
+        # Процесс завершился, не дочитав stdin; ошибку покажет код возврата
+        pass
+
+def run_command(cmd, cwd=None, input=None, stream=False, check=True):
+    """Выполняет системную команду (список аргументов, без shell) с логированием и проверкой ошибок.
+    input (bytes) передается процессу через stdin. Если input – функция, она вызывается уже после запуска
+    процесса, и подготовка данных идет параллельно с его инициализацией. Вывод (stdout и stderr) передается в лог построчно
+    по мере появления: при stream=True на уровне INFO, иначе на уровне DEBUG (виден с --verbose).
+    check=False – ненулевой код возврата является ожидаемым ответом команды и не логируется как ошибка."""
+    cmd = [binary_path(cmd[0]) or cmd[0], *cmd[1:]]
+    logger.debug("Executing: {}", cmd)
+    try:
+        process = subprocess.Popen(cmd, cwd=cwd, stdin=subprocess.PIPE if input is not None else None,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=PIPE_BUFFER_SIZE)
+    except OSError as e:
+        # Без shell отсутствующая программа приводит к исключению, а не к коду возврата 127
+        logger.error("Error executing command: {}", cmd)
+        logger.error(e)
+        return False, str(e)
+    if callable(input):
+        try:
+            input = input()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+    if input is not None:
+        enlarge_pipe(process.stdin.fileno())
+        threading.Thread(target=write_input, args=(process.stdin, input), daemon=True).start()
+
+    log = logger.info if stream else logger.debug
+    lines = []
+    for line in process.stdout:
+        line = line.decode(errors="replace").rstrip("\n")
+        lines.append(line)
+        log(line)
+    process.stdout.close()
+    output = "\n".join(lines)
+    if process.wait() != 0:
+        if check:
+            logger.error("Error executing command: {}", cmd)
+            if not stream:
+                logger.error("output:\n{}", output)
+        return False, output
+    logger.debug("Command executed successfully: {}", cmd)
+    return True, output
 
 def check_brew():
     """Проверяет наличие Homebrew в системе."""
-    if shutil.which("brew") is None:
+    if binary_path("brew") is None:
         logger.error(get_text("brew_not_found"))
         return False
     logger.info(get_text("brew_found"))
     return True
 
+# Директории, наличие которых уже проверено в текущем процессе
+ENSURED_DIRS = set()
+
 def ensure_directory(path):
-    """Создает указанную директорию, если она не существует."""
-    if not os.path.isdir(path):
+    """Создает указанную директорию вместе с родительскими, если она не существует.
+    Проверка и создание выполняются одним вызовом, без отдельного stat."""
+    if path in ENSURED_DIRS:
+        return
+    try:
         os.makedirs(path)
         logger.info(get_text("assist_dir_created").format(path))
+    except FileExistsError:
+        pass
+    ENSURED_DIRS.add(path)
 
-def ensure_assist_dir():
-    """Создает директорию .assistme в домашней папке."""
-    ensure_directory(ASME_DIR)
+def load_yaml():
+    """Импортирует PyYAML и возвращает (yaml, Loader, Dumper).
+    Loader и Dumper работают через libyaml, если PyYAML собран с ней."""
+    import yaml  # pip install pyyaml
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader), getattr(yaml, "CSafeDumper", yaml.SafeDumper)
 
-def ensure_work_dir():
-    """Создает поддиректорию для временных файлов и результатов транскрибации."""
-    ensure_directory(ASME_WORK_DIR)
+def write_file_atomically(path, content):
+    """Записывает файл через временный файл и os.replace, чтобы прерванная запись не оставила его обрезанным."""
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_file, path)
+
+def save_config_cache(config):
+    """Сохраняет JSON-копию конфигурации рядом с YAML: она читается быстрее и без импорта PyYAML.
+    Копия необязательна: при ошибке (например, значение не сериализуется в JSON)
+    устаревшая копия удаляется, чтобы не перекрыть YAML."""
+    cache_file = CURRENT_CONFIG_FILE + ".json"
+    try:
+        write_file_atomically(cache_file, json.dumps(config))
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug("Unable to write configuration cache: {}", e)
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
 
 def load_config():
-    """Загружает конфигурацию из YAML-файла, создавая дефолтную при отсутствии."""
+    """Загружает конфигурацию из YAML-файла, создавая дефолтную при отсутствии.
+    Если JSON-копия не старше YAML, читается она. Возвращает копию: изменения
+    вызывающего кода не попадают в кэш и DEFAULT_CONFIG."""
     global CURRENT_CONFIG_FILE
     if not os.path.exists(CURRENT_CONFIG_FILE):
         logger.info("Configuration file not found, creating default.")
         save_config(DEFAULT_CONFIG)
-        return DEFAULT_CONFIG
+        return copy.deepcopy(DEFAULT_CONFIG)
+    cache_file = CURRENT_CONFIG_FILE + ".json"
+    config = None
+    try:
+        if os.path.exists(cache_file) and os.stat(cache_file).st_mtime_ns >= os.stat(CURRENT_CONFIG_FILE).st_mtime_ns:
+            config = load_cached(cache_file, json.load)
+    except (OSError, ValueError) as e:
+        # Поврежденная копия не должна подменять YAML дефолтами
+        logger.debug("Unable to read configuration cache: {}", e)
     try:
-        with open(CURRENT_CONFIG_FILE, "r") as f:
-            config = yaml.safe_load(f)
-            if not config:
-                config = DEFAULT_CONFIG
+        if config is None:
+            yaml, loader, _ = load_yaml()
+            config = load_cached(CURRENT_CONFIG_FILE, lambda f: yaml.load(f, Loader=loader))
+            if config:
+                save_config_cache(config)
+        if not config:
+            config = DEFAULT_CONFIG
     except Exception as e:
-        logger.error(f"Error reading configuration file: {e}")
+        logger.error("Error reading configuration file: {}", e)
         config = DEFAULT_CONFIG
-    return config
+    return copy.deepcopy(config)
 
 def save_config(config):
-    """Сохраняет конфигурацию в YAML-файл."""
+    """Сохраняет конфигурацию в YAML-файл и его JSON-копию. Запись атомарная,
+    файл не перезаписывается, если его содержимое не изменилось."""
     global CURRENT_CONFIG_FILE
-    with open(CURRENT_CONFIG_FILE, "w") as f:
-        yaml.dump(config, f)
-    logger.info(f"Configuration saved in {CURRENT_CONFIG_FILE}")
+    yaml, _, dumper = load_yaml()
+    # Ключи сохраняются в порядке DEFAULT_CONFIG, без сортировки; вложенные словари – блочным стилем
+    content = yaml.dump(config, Dumper=dumper, default_flow_style=False, sort_keys=False)
+    try:
+        with open(CURRENT_CONFIG_FILE, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return
+    except OSError:
+        pass
+    write_file_atomically(CURRENT_CONFIG_FILE, content)
+    save_config_cache(config)
+    FILE_CACHE.pop(CURRENT_CONFIG_FILE, None)
+    logger.info("Configuration saved in {}", CURRENT_CONFIG_FILE)
 
-def install_command(args):
-    """Команда install: установка Homebrew, ffmpeg, blackhole, клонирование и сборка whisper.cpp."""
-    if not check_brew():
-        sys.exit(1)
-    
-    for pkg in ["ffmpeg", "blackhole-16ch"]:
-        logger.info(get_text("installing_pkg").format(pkg))
-        success, _ = run_command(f"brew install {pkg}")
-        if not success:
-            logger.error(get_text("install_pkg_error").format(pkg))
-            sys.exit(1)
-    
-    ensure_assist_dir()
-    ensure_work_dir()
+def base_model(config):
+    """Возвращает имя модели без квантизации, например large-v3-turbo."""
+    return config.get("model", DEFAULT_CONFIG["model"])
 
-    if not os.path.isdir(ASME_WHISPER_DIR):
-        logger.info(get_text("cloning_whisper"))
-        success, _ = run_command(f"git clone https://github.com/ggerganov/whisper.cpp.git {ASME_WHISPER_DIR}")
-        if not success:
-            logger.error("Error cloning whisper.cpp.")
-            sys.exit(1)
+def model_name(config):
+    """Возвращает имя модели с учетом квантизации, например large-v3-turbo-q5_0."""
+    quant = config.get("quant", DEFAULT_CONFIG["quant"])
+    model = base_model(config)
+    return model if quant == "f16" else f"{model}-{quant}"
+
+def model_file(config):
+    """Возвращает путь до файла ggml-модели."""
+    return os.path.join(ASME_WHISPER_MODELS_DIR, f"ggml-{model_name(config)}.bin")
+
+def cmake_configure_cmd():
+    """Формирует команду конфигурации сборки whisper.cpp с BLAS-ускорением под текущую платформу."""
+    import platform
+    flags = ["-DCMAKE_BUILD_TYPE=Release", "-DGGML_NATIVE=ON", "-DGGML_BLAS=ON"]
+    if sys.platform == "darwin":
+        flags += ["-DGGML_BLAS_VENDOR=Apple", "-DGGML_ACCELERATE=ON"]
+        if platform.machine() == "arm64":
+            # На Apple Silicon матричные операции выполняются на GPU через Metal,
+            # а энкодер – на Neural Engine через Core ML (без Core ML-модели – обычный путь)
+            flags += ["-DGGML_METAL=ON", "-DWHISPER_COREML=1", "-DWHISPER_COREML_ALLOW_FALLBACK=1"]
     else:
-        logger.info(get_text("whisper_exists"))
+        flags.append("-DGGML_BLAS_VENDOR=OpenBLAS")
+    return ["cmake", "-B", "build", *flags]
+
+def coreml_supported():
+    """Core ML-энкодер собирается и используется только на Apple Silicon."""
+    import platform
+    return sys.platform == "darwin" and platform.machine() == "arm64"
+
+def physical_cores():
+    """Число доступных физических ядер: потоки сверх него (Hyper-Threading) не ускоряют whisper.cpp."""
+    count = os.process_cpu_count() if hasattr(os, "process_cpu_count") else os.cpu_count()
+    if sys.platform == "darwin":
+        try:
+            result = subprocess.run(["/usr/sbin/sysctl", "-n", "hw.physicalcpu"],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            if result.returncode == 0:
+                count = min(count or sys.maxsize, int(result.stdout))
+        except (OSError, ValueError):
+            pass
+    return count or 1
+
+# fcntl F_RDADVISE в macOS (sys/fcntl.h); в модуле fcntl Python этой константы нет
+F_RDADVISE = 44
+# Предел ra_count в struct radvisory (int), файл подсказывается частями
+RDADVISE_CHUNK = 1 << 30
+
+def prefetch_file(path):
+    """Просит ядро заранее прочитать файл в page cache (чтение идет асинхронно): posix_fadvise(WILLNEED)
+    в Linux, F_RDADVISE в macOS. Подсказки о последовательном чтении (POSIX_FADV_SEQUENTIAL, F_RDAHEAD)
+    здесь не задаются: они относятся к открытому дескриптору и не действуют на whisper-cli и PyAV,
+    которые открывают файл заново. Если подсказка недоступна на платформе, ничего не делает."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        elif sys.platform == "darwin":
+            import fcntl
+            import struct
+            size = os.fstat(fd).st_size
+            for offset in range(0, size, RDADVISE_CHUNK):
+                # struct radvisory { off_t ra_offset; int ra_count; }
+                fcntl.fcntl(fd, F_RDADVISE, struct.pack("qi4x", offset, min(RDADVISE_CHUNK, size - offset)))
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def recording_duration(source_file):
+    """Длительность записи в секундах по заголовку файла, без декодирования. None, если неизвестна."""
+    import av  # pip install av
+    try:
+        with av.open(source_file) as container:
+            if container.duration is None:
+                return None
+            return container.duration / av.time_base
+    except av.error.FFmpegError:
+        return None
+
+def auto_processors(duration, cores):
+    """Число параллельно распознаваемых частей записи (-p) для whisper-cli."""
+    if not duration:
+        return 1
+    return max(1, min(cores // PARALLEL_MIN_THREADS, int(duration // PARALLEL_MIN_CHUNK_SECONDS)))
+
+def pull_pcm(graph):
+    """Забирает из графа фильтров все готовые кадры и возвращает их PCM-данные."""
+    pcm = bytearray()
+    while True:
+        try:
+            frame = graph.pull()
+        except (BlockingIOError, EOFError):
+            return pcm
+        # Буфер плоскости выровнен и может быть длиннее самих данных (s16 mono = 2 байта на сэмпл)
+        pcm += bytes(frame.planes[0])[:frame.samples * 2]
+
+def skip_silence(config):
+    """Нужно ли вырезать паузы из аудио перед транскрибацией (audio.skip_silence)."""
+    return config.get("audio", {}).get("skip_silence", DEFAULT_CONFIG["audio"]["skip_silence"])
+
+def convert_audio(source_file, skip_silence=False):
+    """Конвертирует запись в WAV 16 кГц моно pcm_s16le прямо в памяти.
+    Аналог `ffmpeg -af lowpass=f=4000 -ar 16000 -ac 1 -c:a pcm_s16le` без запуска отдельного процесса.
+    Сведение в моно и ресемплинг выполняются до фильтров, поэтому silenceremove и lowpass обрабатывают
+    один канал 16 кГц вместо всех каналов исходной частоты. При skip_silence паузы вырезаются,
+    и whisper-cli получает меньше аудио."""
+    import av  # pip install av
+    buffer = io.BytesIO()
+    with av.open(source_file) as container, wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(WHISPER_SAMPLE_RATE)
+
+        stream = container.streams.audio[0]
+        graph = av.filter.Graph()
+        nodes = [
+            graph.add_abuffer(template=stream),
+            graph.add("aresample", DOWNMIX_FILTER_ARGS),
+        ]
+        if skip_silence:
+            nodes.append(graph.add("silenceremove", SILENCE_FILTER_ARGS))
+        nodes += [
+            graph.add("lowpass", "f=4000"),
+            graph.add("aformat", "sample_fmts=s16"),
+            graph.add("abuffersink"),
+        ]
+        graph.link_nodes(*nodes).configure()
 
-    model_file = os.path.join(ASME_WHISPER_DIR, "models", "ggml-large-v2.bin")
-    if not os.path.exists(model_file):
-        logger.info(get_text("downloading_model"))
-        success, _ = run_command("sh ./models/download-ggml-model.sh large-v2", cwd=ASME_WHISPER_DIR)
+        for frame in container.decode(stream):
+            graph.push(frame)
+            wav.writeframesraw(pull_pcm(graph))
+        graph.push(None)
+        wav.writeframesraw(pull_pcm(graph))
+    return buffer.getvalue()
+
+def download(url, dest, stop=None):
+    """Скачивает файл по url блоками по 1 МБ. Файл пишется во временный .part и переименовывается
+    только после полной загрузки, поэтому оборванная загрузка не оставляет битую модель.
+    stop (threading.Event) прерывает загрузку между блоками."""
+    import urllib.request
+    part = dest + ".part"
+    logger.debug("Downloading {} to {}", url, dest)
+    try:
+        # timeout: зависшее соединение завершается ошибкой, и управление переходит к скрипту
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response, open(part, "wb") as f:
+            expected = response.headers.get("Content-Length")
+            written = 0
+            while True:
+                chunk = response.read(PIPE_BUFFER_SIZE)
+                if not chunk:
+                    break
+                if stop is not None and stop.is_set():
+                    raise OSError("download cancelled")
+                f.write(chunk)
+                written += len(chunk)
+        # При обрыве соединения read() возвращает b"" без исключения, поэтому размер проверяется явно
+        if expected is not None and written != int(expected):
+            raise OSError(f"incomplete download: {written} of {expected} bytes")
+        os.replace(part, dest)
+    except OSError as e:
+        # urllib.error.URLError и HTTPError – наследники OSError
+        logger.debug("Download of {} failed: {}", url, e)
+        if os.path.exists(part):
+            os.remove(part)
+        return False
+    return True
+
+def fetch_model(model, stop=None, check=True):
+    """Скачивает ggml-модель напрямую с Hugging Face, без запуска shell-скрипта.
+    Скрипт whisper.cpp остается запасным вариантом (например, если у него другое зеркало).
+    check=False – отказ скрипта ожидаем (у модели может не быть готового файла) и не логируется как ошибка."""
+    dest = os.path.join(ASME_WHISPER_MODELS_DIR, f"ggml-{model}.bin")
+    if download(f"{WHISPER_MODELS_URL}/ggml-{model}.bin", dest, stop):
+        return True
+    if stop is not None and stop.is_set():
+        return False
+    success, _ = run_command(["sh", "./models/download-ggml-model.sh", model], cwd=ASME_WHISPER_DIR, check=check)
+    return success
+
+def quantize_model(config):
+    """Получает квантизованную модель из f16: скачивает ее при необходимости и запускает quantize.
+    Скачанная только ради квантизации f16-модель затем удаляется."""
+    model = base_model(config)
+    quant = config.get("quant", DEFAULT_CONFIG["quant"])
+    source = os.path.join(ASME_WHISPER_MODELS_DIR, f"ggml-{model}.bin")
+    # Утилита квантизации называлась quantize до переименования бинарников whisper.cpp
+    quantize = whisper_binary_path("whisper-quantize", "quantize")
+    if quantize is None:
+        logger.error("quantize binary not found. Ensure whisper.cpp was built successfully.")
+        return False
+    downloaded = not os.path.exists(source)
+    if downloaded:
+        logger.info(get_text("downloading_model").format(model))
+        if not fetch_model(model):
+            return False
+    logger.info(get_text("quantizing_model").format(model, quant))
+    success, _ = run_command([quantize, source, model_file(config), quant], cwd=ASME_WHISPER_DIR)
+    if not success and os.path.exists(model_file(config)):
+        os.remove(model_file(config))
+    if downloaded:
+        os.remove(source)
+    return success
+
+def installed_versions(formulae, casks):
+    """Возвращает (все ли пакеты установлены, строки "пакет версия" для установленных).
+    brew list --versions без --cask ищет только формулы, поэтому формулы и cask-и проверяются отдельно."""
+    installed, lines = True, []
+    for kind, names in [("--formula", formulae), ("--cask", casks)]:
+        # Ненулевой код возврата означает, что хотя бы один пакет не установлен
+        success, versions = run_command(["brew", "list", "--versions", kind, *names], check=False)
+        installed = installed and success
+        lines += versions.splitlines()
+    return installed, lines
+
+def install_packages():
+    """Устанавливает зависимости через brew. Возвращает True при успехе."""
+    formulae = ["ffmpeg"]
+    if sys.platform != "darwin":
+        formulae.append("openblas")
+    casks = ["blackhole-16ch"]
+    packages = formulae + casks
+    # Если все пакеты уже на месте, brew install (с автообновлением индекса формул) не запускается
+    installed, versions = installed_versions(formulae, casks)
+    if not installed:
+        # Один вызов brew: индекс формул загружается и зависимости разрешаются один раз
+        logger.info(get_text("installing_pkg").format(", ".join(packages)))
+        success, _ = run_command(["brew", "install", *packages])
         if not success:
-            logger.error("Error downloading model.")
-            sys.exit(1)
-    else:
-        logger.info(get_text("model_exists"))
+            logger.error(get_text("install_pkg_error").format(", ".join(packages)))
+            return False
+        _, versions = installed_versions(formulae, casks)
+    for line in versions:
+        logger.info(get_text("pkg_installed").format(line))
+    return True
+
+def clone_whisper():
+    """Клонирует репозиторий whisper.cpp, если его еще нет. Возвращает True при успехе."""
+    if os.path.isdir(ASME_WHISPER_DIR):
+        logger.info(get_text("whisper_exists"))
+        return True
+    logger.info(get_text("cloning_whisper"))
+    success, _ = run_command(["git", "clone", "https://github.com/ggerganov/whisper.cpp.git", ASME_WHISPER_DIR])
+    if not success:
+        logger.error("Error cloning whisper.cpp.")
+    return success
 
-    whisper_cli = os.path.join(ASME_WHISPER_DIR, "build", "bin", "whisper-cli")
-    if not os.path.exists(whisper_cli):
-        logger.info(get_text("building_whisper"))
-        success, _ = run_command("cmake -B build", cwd=ASME_WHISPER_DIR)
+def build_whisper():
+    """Собирает whisper.cpp, если whisper-cli еще не собран. Возвращает True при успехе."""
+    if whisper_cli_path() is not None:
+        logger.info(get_text("whisper_exists"))
+        return True
+    logger.info(get_text("building_whisper"))
+    for cmd in [cmake_configure_cmd(), ["cmake", "--build", "build", "--config", "Release"]]:
+        success, _ = run_command(cmd, cwd=ASME_WHISPER_DIR)
         if not success:
             logger.error(get_text("build_error"))
-            sys.exit(1)
-        success, _ = run_command("cmake --build build --config Release", cwd=ASME_WHISPER_DIR)
+            return False
+    return True
+
+def download_model(config, stop=None):
+    """Скачивает готовую модель с нужной квантизацией, если ее еще нет. Возвращает True,
+    если файл модели на месте; False – если готового файла нет и нужна квантизация.
+    stop (threading.Event) прерывает загрузку."""
+    model = model_name(config)
+    if os.path.exists(model_file(config)):
+        logger.info(get_text("model_exists").format(model))
+        return True
+    logger.info(get_text("downloading_model").format(model))
+    # Для квантизованной модели отсутствие готового файла не ошибка: ее можно квантизовать локально
+    return fetch_model(model, stop, check=model == base_model(config))
+
+def install_command(args):
+    """Команда install: установка Homebrew, ffmpeg, blackhole, клонирование и сборка whisper.cpp.
+    Независимые шаги выполняются параллельно: brew – одновременно с клонированием, загрузка модели –
+    одновременно с brew и сборкой. Сборка ждет brew (ей нужны зависимости), а квантизация – сборки."""
+    from concurrent.futures import ThreadPoolExecutor
+    if not check_brew():
+        sys.exit(1)
+
+    ensure_directory(ASME_WORK_DIR)
+    config = load_config()
+
+    # Выход из программы – только после пула: при ошибке или Ctrl+C загрузка модели прерывается
+    # через stop, а не дожидается окончания
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=2)
+    success = False
+    try:
+        packages = pool.submit(install_packages)
+        cloned = clone_whisper()
+        model = pool.submit(download_model, config, stop) if cloned else None
+        built = cloned and packages.result() and build_whisper()
+        downloaded = built and model.result()
+        success = built
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    if not success:
+        sys.exit(1)
+
+    if not downloaded and model_name(config) != base_model(config):
+        # Готового квантизованного файла нет – квантизуем f16-модель локально (нужна утилита из сборки)
+        downloaded = quantize_model(config)
+    if not downloaded:
+        logger.error("Error downloading model.")
+        sys.exit(1)
+
+    model = base_model(config)
+    coreml_model = os.path.join(ASME_WHISPER_MODELS_DIR, f"ggml-{model}-encoder.mlmodelc")
+    if coreml_supported() and not os.path.exists(coreml_model):
+        # Для Core ML нужна модель энкодера без квантизации; при ошибке whisper-cli работает без нее.
+        # Скрипту нужны coremltools и openai-whisper, без них он заведомо падает
+        success, _ = run_command(["python3", "-c", "import coremltools, whisper"], check=False)
+        if success:
+            logger.info(get_text("generating_coreml").format(model))
+            success, _ = run_command(["sh", "./models/generate-coreml-model.sh", model], cwd=ASME_WHISPER_DIR, check=False)
         if not success:
-            logger.error(get_text("build_error"))
-            sys.exit(1)
-    else:
-        logger.info(get_text("whisper_exists"))
+            logger.warning(get_text("coreml_error"))
     
     logger.info(get_text("install_success"))
     logger.info(get_text("manual_setup_notice"))
 
-def record_command(args):
-    """Команда record: запись звука через ffmpeg с параметрами из конфигурации.
-    Если файл записи уже существует, запрашивает подтверждение на перезапись."""
-    ensure_assist_dir()
-    ensure_work_dir()
-    config = load_config()
-
+def confirm_record_overwrite():
+    """Если файл записи уже существует, запрашивает подтверждение на перезапись."""
     if os.path.exists(ASME_RECORD_FILE):
         answer = input(get_text("file_exists").format(ASME_RECORD_FILE)).strip().lower()
         if answer != 'y':
             logger.info(get_text("record_cancelled"))
             sys.exit(0)
-    
+
+def ffmpeg_capture_cmd(config):
+    """Возвращает начало команды ffmpeg: захват микрофона и системного звука из конфигурации."""
     audio = config.get("audio", DEFAULT_CONFIG["audio"])
-    audio_input = audio.get("input")
-    audio_output = audio.get("output")
+    # -y: перезапись уже подтверждена пользователем; -loglevel error: в терминал выводятся только ошибки;
+    # -nostdin: ввод с клавиатуры остается за нами (название сессии), запись останавливается через Ctrl+C
+    return [binary_path("ffmpeg") or "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+            "-f", "avfoundation", "-i", audio.get("input"),
+            "-f", "avfoundation", "-i", audio.get("output")]
 
-    ffmpeg_cmd = (f'ffmpeg -f avfoundation -i "{audio_input}" '
-                  f'-f avfoundation -i "{audio_output}" '
-                  f'-filter_complex amerge=inputs=2 "{ASME_RECORD_FILE}"')
-    logger.info(get_text("recording"))
+def wait_recording(process):
+    """Ожидает завершения записи. Возвращает True, если запись остановлена через Ctrl+C."""
     try:
-        run_command(ffmpeg_cmd)
+        process.wait()
     except KeyboardInterrupt:
-        logger.info(get_text("record_cancelled"))
-    except subprocess.CalledProcessError as e:
-        logger.error(get_text("record_error"))
-        logger.error(e)
-        sys.exit(1)
+        # Ctrl+C получает и ffmpeg – дожидаемся, пока он допишет файл
+        try:
+            process.wait()
+        except KeyboardInterrupt:
+            # Повторный Ctrl+C: не ждем ffmpeg
+            process.kill()
+            process.wait()
+            logger.info(get_text("record_cancelled"))
+            sys.exit(1)
+        return True
+    return False
 
-def transcribate_command(args):
-    """Команда transcribate: конвертация аудиофайла, транскрибация и сохранение результатов.
-    Перед транскрибацией запрашивает название сессии и переименовывает рабочую директорию."""
-    ensure_assist_dir()
-    ensure_work_dir()
-    
-    if not os.path.exists(ASME_RECORD_FILE):
-        logger.error(f"Recording file {ASME_RECORD_FILE} not found. Run the record command first.")
+def drain_pipe(stream, chunks):
+    """Читает stream до конца, складывая блоки в очередь chunks; None означает конец потока.
+    Канал разгружается сразу, даже если получатель еще не читает – так ffmpeg не блокируется."""
+    for chunk in iter(lambda: stream.read1(PIPE_BUFFER_SIZE), b""):
+        chunks.put(chunk)
+    chunks.put(None)
+
+def feed_pipe(chunks, stream):
+    """Передает блоки из очереди chunks в stream до None и закрывает его. Если получатель
+    завершился, оставшиеся блоки отбрасываются, чтобы drain_pipe продолжал разгружать источник."""
+    alive = True
+    for chunk in iter(chunks.get, None):
+        if alive:
+            try:
+                stream.write(chunk)
+            except BrokenPipeError:
+                alive = False
+    try:
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+def whisper_command(config, output_file, duration=None):
+    """Формирует команду whisper-cli: аудио читается из stdin (-f -), результат пишется в output_file.txt (-of;
+    относительный путь отсчитывается от рабочей директории whisper-cli). Завершает программу, если
+    whisper-cli или модель не найдены.
+    duration – длительность записи в секундах, если известна заранее (для автоматического -p)."""
+    model_path = model_file(config)
+    whisper_cli = whisper_cli_path()
+    if whisper_cli is None:
+        logger.error("whisper-cli binary not found. Ensure the install command was successful.")
         sys.exit(1)
-    
+    if not os.path.exists(model_path):
+        logger.error("Model {} not found. Run the install command to download it.", model_path)
+        sys.exit(1)
+
+    whisper = {**DEFAULT_CONFIG["whisper"], **config.get("whisper", {})}
+    cores = physical_cores()
+    processors = auto_processors(duration, cores) if whisper["processors"] == "auto" else whisper["processors"]
+    # Каждый процессор запускает свои -t потоков, поэтому ядра делятся между ними
+    threads = max(1, cores // processors) if whisper["threads"] == "auto" else whisper["threads"]
+    transcribe_cmd = [whisper_cli, "-t", str(threads), "-p", str(processors),
+                      "-bs", str(whisper["beam"]), "-bo", str(whisper["best_of"]), "-m", model_path,
+                      "-l", whisper["language"], "--output-txt", "-of", output_file,
+                      # -np: в выводе остаются только распознанный текст и ошибки
+                      "-np"]
+    if whisper["flash_attention"]:
+        transcribe_cmd.append("-fa")
+    transcribe_cmd += ["-f", "-"]
+    return transcribe_cmd
+
+def ask_session_dir():
+    """Запрашивает название сессии и возвращает путь до ее будущей директории."""
     try:
         session_name = input(get_text("session_prompt")).strip()
-        while not re.fullmatch(r'[A-Za-z0-9_-]+', session_name):
+        while not SESSION_NAME_RE.match(session_name):
             logger.warning(get_text("invalid_session"))
             session_name = input(get_text("session_prompt")).strip()
     except KeyboardInterrupt:
         sys.exit(1)
     
-    new_session_dir = os.path.join(ASME_DIR, f"session-{session_name}")
-    if os.path.exists(new_session_dir):
-        logger.error(get_text("session_exists").format(new_session_dir))
+    session_dir = os.path.join(ASME_DIR, f"session-{session_name}")
+    if os.path.exists(session_dir):
+        logger.error(get_text("session_exists").format(session_dir))
         sys.exit(1)
-    
+    return session_dir
+
+def rename_session(session_dir):
+    """Переименовывает рабочую директорию в директорию сессии."""
     try:
-        os.rename(ASME_WORK_DIR, new_session_dir)
-        logger.info(get_text("session_renamed").format(new_session_dir))
+        os.rename(ASME_WORK_DIR, session_dir)
+        ENSURED_DIRS.discard(ASME_WORK_DIR)
+        logger.info(get_text("session_renamed").format(session_dir))
     except Exception as e:
         logger.error(get_text("session_rename_error").format(e))
         sys.exit(1)
+
+def finish_session(config, session_dir):
+    """Удаляет исходную запись, если она не нужна, и сообщает, где лежат результаты."""
+    result = None
+    if not config.get('keep_source'):
+        os.remove(os.path.join(session_dir, RECORD_FILE_NAME))
+        result = get_text("file_saved")
+    else:
+        result = get_text("files_saved")
     
-    TMP_ASME_WORK_DIR = new_session_dir
-    TMP_ASME_RECORD_FILE = os.path.join(TMP_ASME_WORK_DIR, "record.mp3")
-    TMP_ASME_OUTPUT_FILE = os.path.join(TMP_ASME_WORK_DIR, "output.wav")
-    
-    ffmpeg_conv_cmd = (f'ffmpeg -i "{TMP_ASME_RECORD_FILE}" -af "lowpass=f=4000" '
-                       f'-ar 16000 -ac 1 -c:a pcm_s16le "{TMP_ASME_OUTPUT_FILE}"')
-    logger.info(get_text("conversion_started"))
-    success, _ = run_command(ffmpeg_conv_cmd)
-    if not success:
-        logger.error(get_text("conversion_error"))
+    logger.info(result.format(session_dir))
+
+def record_command(args):
+    """Команда record: запись звука через ffmpeg с параметрами из конфигурации.
+    Если файл записи уже существует, запрашивает подтверждение на перезапись."""
+    ensure_directory(ASME_WORK_DIR)
+    config = load_config()
+    confirm_record_overwrite()
+
+    # Запись сразу сохраняется в формате whisper.cpp: без кодирования в MP3 и повторного декодирования
+    ffmpeg_cmd = ffmpeg_capture_cmd(config) + [
+        "-filter_complex", f"amerge=inputs=2,aresample={DOWNMIX_FILTER_ARGS}", "-c:a", "pcm_s16le", ASME_RECORD_FILE]
+    logger.info(get_text("recording"))
+    logger.debug("Executing: {}", ffmpeg_cmd)
+    # ffmpeg сам пишет файл записи, его вывод не читается – поэтому обходимся без каналов
+    try:
+        process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.DEVNULL)
+    except OSError as e:
+        logger.error(get_text("record_error"))
+        logger.error(e)
         sys.exit(1)
+    if wait_recording(process):
+        logger.info(get_text("record_cancelled"))
+    elif process.returncode != 0:
+        logger.error(get_text("record_error"))
+        sys.exit(1)
+
+def stream_command(args):
+    """Запись и транскрибация одним конвейером: ffmpeg, помимо record.wav, отдает
+    16 кГц моно WAV, который передается в stdin whisper-cli. Модель загружается, пока идет запись,
+    а транскрибация выполняется без повторного декодирования записи.
+    whisper-cli начинает читать stdin только после загрузки модели, а канал в macOS вмещает 64 КБ
+    (около 2 секунд аудио), поэтому аудио между процессами буферизуется в памяти: иначе ffmpeg
+    остановился бы на записи в канал вместе с записью record.wav."""
+    import queue
+    ensure_directory(ASME_WORK_DIR)
+    config = load_config()
+    confirm_record_overwrite()
+
+    transcribe_cmd = whisper_command(config, ASME_OUTPUT_FILE)
+    asr_filter = f"silenceremove={SILENCE_FILTER_ARGS},lowpass=f=4000" if skip_silence(config) else "lowpass=f=4000"
+    ffmpeg_cmd = ffmpeg_capture_cmd(config) + [
+        # Сведение и ресемплинг выполняются один раз, до разделения на запись и поток для whisper-cli
+        "-filter_complex", f"amerge=inputs=2,aresample={DOWNMIX_FILTER_ARGS},asplit=2[record][asr];[asr]{asr_filter}[pcm]",
+        "-map", "[record]", "-c:a", "pcm_s16le", ASME_RECORD_FILE,
+        "-map", "[pcm]", "-c:a", "pcm_s16le", "-f", "wav", "-"]
+
+    logger.info(get_text("recording"))
+    logger.debug("Executing: {}", transcribe_cmd)
+    logger.debug("Executing: {}", ffmpeg_cmd)
+    pipe_read, pipe_write = os.pipe()
+    enlarge_pipe(pipe_write)
+    try:
+        # Отдельная сессия: Ctrl+C останавливает только ffmpeg, whisper-cli дочитывает stdin до конца
+        whisper = subprocess.Popen(transcribe_cmd, cwd=ASME_WORK_DIR, start_new_session=True,
+                                   stdin=pipe_read, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   bufsize=PIPE_BUFFER_SIZE)
+    except OSError as e:
+        os.close(pipe_write)
+        logger.error(get_text("transcription_error"))
+        logger.error(e)
+        sys.exit(1)
+    finally:
+        os.close(pipe_read)
+    try:
+        ffmpeg = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, bufsize=PIPE_BUFFER_SIZE)
+    except OSError as e:
+        os.close(pipe_write)
+        whisper.kill()
+        logger.error(get_text("record_error"))
+        logger.error(e)
+        sys.exit(1)
+    enlarge_pipe(ffmpeg.stdout.fileno())
+    # Канал в whisper-cli закрывает feed_pipe, когда ffmpeg завершится: это конец аудио для whisper-cli
+    chunks = queue.SimpleQueue()
+    threading.Thread(target=drain_pipe, args=(ffmpeg.stdout, chunks), daemon=True).start()
+    threading.Thread(target=feed_pipe, args=(chunks, open(pipe_write, "wb", buffering=PIPE_BUFFER_SIZE)),
+                     daemon=True).start()
+
+    try:
+        if not wait_recording(ffmpeg) and ffmpeg.returncode != 0:
+            whisper.kill()
+            logger.error(get_text("record_error"))
+            sys.exit(1)
+
+        # Название сессии запрашивается, пока whisper-cli распознает запись
+        logger.info(get_text("transcription_started"))
+        session_dir = ask_session_dir()
+        try:
+            stdout, stderr = whisper.communicate()
+        except KeyboardInterrupt:
+            # whisper-cli в отдельной сессии Ctrl+C не получает, его нужно остановить явно
+            logger.info(get_text("transcription_cancelled").format(ASME_WORK_DIR))
+            sys.exit(1)
+    finally:
+        if whisper.poll() is None:
+            whisper.kill()
+            whisper.wait()
+    if whisper.returncode != 0:
+        logger.error(get_text("transcription_error"))
+        logger.error("stderr:\n{}", stderr.decode(errors="replace"))
+        sys.exit(1)
+    logger.info(get_text("transcription_success"))
+    logger.info(stdout.decode(errors="replace"))
+
+    rename_session(session_dir)
+    finish_session(config, session_dir)
+
+def transcribate_command(args):
+    """Команда transcribate: конвертация аудиофайла, транскрибация и сохранение результатов.
+    Перед транскрибацией запрашивает название сессии и переименовывает рабочую директорию."""
+    ensure_directory(ASME_WORK_DIR)
     
-    whisper_cli = os.path.join(ASME_WHISPER_DIR, "build", "bin", "whisper-cli")
-    model_path = os.path.join(ASME_WHISPER_DIR, "models", "ggml-large-v2.bin")
-    if not os.path.exists(whisper_cli):
-        logger.error("whisper-cli binary not found. Ensure the install command was successful.")
+    if not os.path.exists(ASME_RECORD_FILE):
+        logger.error("Recording file {} not found. Run the record command first.", ASME_RECORD_FILE)
         sys.exit(1)
+
+    config = load_config()
+    if args.model:
+        config["model"] = args.model
+    # Команда (и наличие whisper-cli и модели) проверяется до переименования рабочей директории, чтобы
+    # при ошибке запись осталась на месте и transcribate можно было повторить. Путь результата
+    # относительный: whisper-cli запускается в директории сессии
+    transcribe_cmd = whisper_command(config, OUTPUT_FILE_NAME, recording_duration(ASME_RECORD_FILE))
+    # Модель и запись читаются с диска, пока пользователь вводит название сессии
+    prefetch_file(model_file(config))
+    prefetch_file(ASME_RECORD_FILE)
+
+    session_dir = ask_session_dir()
+    rename_session(session_dir)
     
-    transcribe_cmd = (f'"{whisper_cli}" -t 8 -p 2 -m "{model_path}" '
-                      f'-l ru --output-txt -f "{TMP_ASME_OUTPUT_FILE}"')
-    logger.info(get_text("transcription_started"))
-    success, output = run_command(transcribe_cmd, cwd=TMP_ASME_WORK_DIR)
+    TMP_ASME_RECORD_FILE = os.path.join(session_dir, RECORD_FILE_NAME)
+
+    def prepare_audio():
+        audio = convert_audio(TMP_ASME_RECORD_FILE, skip_silence(config))
+        logger.info(get_text("transcription_started"))
+        return audio
+
+    # whisper-cli запускается до конвертации: модель загружается, пока декодируется запись.
+    # Распознанные сегменты выводятся по мере готовности
+    logger.info(get_text("conversion_started"))
+    try:
+        success, _ = run_command(transcribe_cmd, cwd=session_dir, input=prepare_audio, stream=True)
+    except Exception as e:
+        logger.error(get_text("conversion_error"))
+        logger.error(e)
+        sys.exit(1)
     if not success:
         logger.error(get_text("transcription_error"))
         sys.exit(1)
     else:
         logger.info(get_text("transcription_success"))
-        logger.info(output)
 
-    config = load_config()
-    result = None
-    if not config.get('keep_source'):
-        os.remove(TMP_ASME_RECORD_FILE)
-        os.remove(TMP_ASME_OUTPUT_FILE)
-        result = get_text("file_saved")
-    else:
-        result = get_text("files_saved")
-    
-    logger.info(result.format(TMP_ASME_WORK_DIR))
+    finish_session(config, session_dir)
 
 def record_dispatcher(args):
     """
-    Если передан флаг stream ИЛИ выставлена настройка – эмулируем непрерывную запись и транскрибацию
+    Если передан флаг stream ИЛИ выставлена настройка – запись и транскрибация выполняются одним конвейером
     """
-    record_command(args)
     config = load_config()
     if args.stream or config.get('stream_mode'):
-        transcribate_command(args)
+        stream_command(args)
+    else:
+        record_command(args)
 
 def get_version():
     return 'debug'
@@ -301,9 +969,14 @@ def set_setting(arg):
         key, value = n.split("=", 1)
         parts = key.split(".")
         if parts[0] == "audio":
-            if len(parts) != 2 or parts[1] not in ["input", "output"]:
+            if len(parts) != 2 or parts[1] not in ["input", "output", "skip_silence"]:
                 logger.error(get_text("setting_invalid_key").format(key))
                 sys.exit(1)
+            if parts[1] == "skip_silence":
+                if value not in ["true", "false"]:
+                    logger.error(get_text("setting_invalid_value").format(key, value))
+                    sys.exit(1)
+                value = value == "true"
             if "audio" not in config or not isinstance(config["audio"], dict):
                 config["audio"] = {}
             config["audio"][parts[1]] = value
@@ -312,6 +985,39 @@ def set_setting(arg):
                 logger.error(get_text("setting_invalid_value").format(key, value))
                 sys.exit(1)
             config["lang"] = value
+        elif parts[0] == "model":
+            if not MODEL_NAME_RE.match(value):
+                logger.error(get_text("setting_invalid_value").format(key, value))
+                sys.exit(1)
+            config["model"] = value
+        elif parts[0] == "quant":
+            if value not in WHISPER_QUANTS:
+                logger.error(get_text("setting_invalid_value").format(key, value))
+                sys.exit(1)
+            config["quant"] = value
+        elif parts[0] == "whisper":
+            if len(parts) != 2 or parts[1] not in DEFAULT_CONFIG["whisper"]:
+                logger.error(get_text("setting_invalid_key").format(key))
+                sys.exit(1)
+            if parts[1] == "language":
+                if not LANGUAGE_RE.match(value):
+                    logger.error(get_text("setting_invalid_value").format(key, value))
+                    sys.exit(1)
+            elif parts[1] == "flash_attention":
+                if value not in ["true", "false"]:
+                    logger.error(get_text("setting_invalid_value").format(key, value))
+                    sys.exit(1)
+                value = value == "true"
+            elif parts[1] in ["threads", "processors"] and value == "auto":
+                pass
+            else:
+                if not value.isdigit() or int(value) < 1:
+                    logger.error(get_text("setting_invalid_value").format(key, value))
+                    sys.exit(1)
+                value = int(value)
+            if "whisper" not in config or not isinstance(config["whisper"], dict):
+                config["whisper"] = {}
+            config["whisper"][parts[1]] = value
         else:
             logger.warning(get_text("setting_invalid_key").format(key))
     save_config(config)
@@ -334,12 +1040,59 @@ def configure_default_parser(p: argparse.ArgumentParser):
 
     p.add_argument('-h', '--help', action='help', default=argparse.SUPPRESS, help=get_text("help_help"))
 
+def build_record_parser(subparsers):
+    parser_record = subparsers.add_parser("record", help=get_text("record_help"), aliases=["r", "rec"], add_help=False)
+    parser_record.add_argument("--stream", help=get_text("record_stream_help"), action='store_true')
+    parser_record.set_defaults(func=record_dispatcher)
+    configure_default_parser(parser_record)
+
+def model_argument(value):
+    """Проверяет название модели в аргументе --model."""
+    if not MODEL_NAME_RE.match(value):
+        raise argparse.ArgumentTypeError(get_text("setting_invalid_value").format("--model", value))
+    return value
+
+def build_transcribate_parser(subparsers):
+    parser_transcribate = subparsers.add_parser("transcribate", help=get_text("transcribate_help"), aliases=["t", "trb"], add_help=False)
+    parser_transcribate.add_argument("--model", help=get_text("transcribate_model_help"), type=model_argument)
+    parser_transcribate.set_defaults(func=transcribate_command)
+    configure_default_parser(parser_transcribate)
+
+def build_env_parser(subparsers):
+    parser_env = subparsers.add_parser("env", help=get_text("env_help"), add_help=False, aliases=["e"])
+    configure_default_parser(parser_env)
+    
+    # Второй уровень
+    env_subparsers = parser_env.add_subparsers(dest="command", help="", metavar="")
+    parser_install = env_subparsers.add_parser("install", help=get_text("install_help"), aliases=["i"], add_help=False, description=get_text("install_help_detailed"))
+    parser_install.set_defaults(func=install_command)
+    configure_default_parser(parser_install)
+
+    parser_setting_setter = env_subparsers.add_parser("set", help=get_text("setting_key_value"), aliases=["s"], add_help=False)
+    parser_setting_setter.add_argument(dest="kv", help=get_text("setting_key_value"), nargs="...")
+    parser_setting_setter.set_defaults(func=set_setting)
+
+    parser_setting_getter = env_subparsers.add_parser("get", help=get_text("getting_value_by_key"), aliases=["g"], add_help=False)
+    parser_setting_getter.add_argument(dest="key", help=get_text("getting_value_by_key"))
+    parser_setting_getter.set_defaults(func=get_setting)
+
+# Построители подкоманд первого уровня по имени и псевдонимам
+ALL_COMMAND_BUILDERS = [build_record_parser, build_transcribate_parser, build_env_parser]
+COMMAND_BUILDERS = {
+    **dict.fromkeys(["record", "r", "rec"], build_record_parser),
+    **dict.fromkeys(["transcribate", "t", "trb"], build_transcribate_parser),
+    **dict.fromkeys(["env", "e"], build_env_parser),
+}
+
 def main():
     # Предварительный разбор для определения языка и пути к конфигурационному файлу
     pre_parser = argparse.ArgumentParser(add_help=False)
     pre_parser.add_argument("-l", "--language", choices=["en", "ru"])
     pre_parser.add_argument("-c", "--config")
-    pre_args, _ = pre_parser.parse_known_args()
+    pre_parser.add_argument("--verbose", action="store_true")
+    pre_args, rest = pre_parser.parse_known_args()
+    if pre_args.verbose:
+        enable_verbose_logging()
     
     # Если указан путь до конфигурационного файла, обновляем глобальную переменную
     global CURRENT_CONFIG_FILE
@@ -349,45 +1102,25 @@ def main():
     config = load_config()
     global CURRENT_LANG, TRANSLATIONS
     CURRENT_LANG = pre_args.language or config.get("lang", "en")
-    TRANSLATIONS = load_translations(TRANSLATIONS_FILE)
-    if CURRENT_LANG not in TRANSLATIONS:
+    translations = load_translations(TRANSLATIONS_FILE)
+    if CURRENT_LANG not in translations:
         CURRENT_LANG = "en"
+    # Плоский словарь текущего языка; недостающие ключи берутся из английского
+    TRANSLATIONS = {**translations.get("en", {}), **translations.get(CURRENT_LANG, {})}
     
     # Создание основного парсера с локализованными описаниями
     parser = argparse.ArgumentParser(description=get_text("cli_description"), add_help=False)
     parser.add_argument('-v', '--version', action='version', version=get_version(), help=get_text("version_help"))
     parser.add_argument('-l', '--language', choices=["en", "ru"], help=get_text("lang_help"))
     parser.add_argument('-c', '--config', help=get_text("config_help"))
+    parser.add_argument('--verbose', action='store_true', help=get_text("verbose_help"))
     configure_default_parser(parser)
     
-    # Первый уровень
+    # Первый уровень: строится только запрошенная подкоманда, для общей справки и ошибок – все
     subparsers = parser.add_subparsers(dest="command", help="", metavar="")
-
-    parser_record = subparsers.add_parser("record", help=get_text("record_help"), aliases=["r", "rec"], add_help=False)
-    parser_record.add_argument("--stream", help=get_text("record_stream_help"), action='store_true')
-    parser_record.set_defaults(func=record_dispatcher)
-    configure_default_parser(parser_record)
-    
-    parser_transcribate = subparsers.add_parser("transcribate", help=get_text("transcribate_help"), aliases=["t", "trb"], add_help=False)
-    parser_transcribate.set_defaults(func=transcribate_command)
-    configure_default_parser(parser_transcribate)
-    
-    # Второй уровень
-    parser_env = subparsers.add_parser("env", help=get_text("env_help"), add_help=False, aliases=["e"])
-    configure_default_parser(parser_env)
-    
-    env_subparsers = parser_env.add_subparsers(dest="command", help="", metavar="")
-    parser_install = env_subparsers.add_parser("install", help=get_text("install_help"), aliases=["i"], add_help=False, description=get_text("install_help_detailed"))
-    parser_install.set_defaults(func=install_command)
-    configure_default_parser(parser_install)
-
-    parser_setting_setter = env_subparsers.add_parser("set", help=get_text("setting_key_value"), aliases=["s"], add_help=False)
-    parser_setting_setter.add_argument(dest="kv", help=get_text("setting_key_value"), nargs="...")
-    parser_setting_setter.set_defaults(func=set_setting)
-
-    parser_setting_getter = env_subparsers.add_parser("get", help=get_text("getting_value_by_key"), aliases=["g"], add_help=False)
-    parser_setting_getter.add_argument(dest="key", help=get_text("getting_value_by_key"))
-    parser_setting_getter.set_defaults(func=get_setting)
+    builder = COMMAND_BUILDERS.get(rest[0]) if rest else None
+    for build in [builder] if builder else ALL_COMMAND_BUILDERS:
+        build(subparsers)
     
     args = parser.parse_args()
     if args.command is None:
@@ -1,16 +1,29 @@
-import PyInstaller.__main__
+import shutil
 from pathlib import Path
 
 HERE = Path(__file__).parent.absolute()
 path_to_main = str(HERE / "main.py")
 
 def install():
-    PyInstaller.__main__.run([
+    import PyInstaller.__main__
+    args = [
         path_to_main,
         '--onefile',
         '--nowindow',
+        '--noconfirm',
         '--log-level=WARN',
         '--add-data=translations.json:.',
         '--name=assistme',
-        '--optimize=2'
-    ])
\ No newline at end of file
+        '--optimize=2',
+        '--strip',
+        # Неиспользуемые модули стандартной библиотеки только увеличивают архив, распаковываемый при запуске
+        '--exclude-module=tkinter',
+        '--exclude-module=unittest',
+        '--exclude-module=pydoc',
+        '--exclude-module=test',
+    ]
+    # UPX – необязательная зависимость сборки (brew install upx)
+    upx = shutil.which("upx")
+    if upx:
+        args.append(f'--upx-dir={Path(upx).parent}')
+    PyInstaller.__main__.run(args)